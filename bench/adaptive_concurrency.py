@@ -0,0 +1,133 @@
+"""
+Validation of the adaptive concurrency against local stand-in hosts.
+
+Usage: python bench/adaptive_concurrency.py (seconds)
+
+Local HTTP servers simulate hosts of different capacities: their latency
+grows with the requests in flight and they answer 503 over their capacity.
+A dead host never answers. Many workers crawl every host at once through
+retrieveWebContent for the given amount of seconds (10 by default), then
+the pages/s, the throttling rate and the final limit of every host are
+reported. The script exits with 1 if a host was throttled too often, if
+a fast host was not given more concurrency than a small one, or if the
+dead host collapsed the global limit.
+"""
+import http.server
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data import web_crawler
+from logger import LOGGER
+
+# The capacity (requests at once) and the base latency of the simulated hosts.
+HOSTS = {'small blog': (3, 0.02), 'medium site': (12, 0.02), 'cdn': (60, 0.01)}
+
+WORKERS_PER_HOST = 40
+
+
+class StandInServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+    request_queue_size = 512
+
+
+def start_host(capacity: int, latency: float) -> str:
+    """Start a stand-in host and get its base url."""
+    lock = threading.Lock()
+    active = [0]
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            with lock:
+                active[0] += 1
+                load = active[0]
+            try:
+                if load > capacity:
+                    self.send_response(503)
+                    self.end_headers()
+                    return
+                # The latency grows once the host is half loaded.
+                time.sleep(latency * (1 + max(0, load - capacity / 2) * 0.5))
+                self.send_response(200)
+                self.end_headers()
+                self.wfile.write(b'<html>recipe</html>')
+            finally:
+                with lock:
+                    active[0] -= 1
+
+    server = StandInServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f'http://127.0.0.1:{server.server_address[1]}'
+
+
+def start_dead_host() -> str:
+    """Start a host that accepts the connections but never answers."""
+    listener = socket.socket()
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(512)
+    connections = []
+
+    def accept_forever():
+        while True:
+            connections.append(listener.accept()[0])
+
+    threading.Thread(target=accept_forever, daemon=True).start()
+    return f'http://127.0.0.1:{listener.getsockname()[1]}'
+
+
+def main(seconds: float = 10) -> int:
+    LOGGER.level = 0
+    web_crawler.REQUEST_TIMEOUT = 1
+    web_crawler.LIMITER.timeout = 1
+    initial_global_limit = web_crawler.LIMITER.global_limit
+
+    urls = {name: start_host(*capacity) for name, capacity in HOSTS.items()}
+    urls['dead host'] = start_dead_host()
+    counts = {name: [0, 0] for name in urls}
+    stop = time.monotonic() + seconds
+
+    def crawl(name: str):
+        while time.monotonic() < stop:
+            content = web_crawler.retrieveWebContent(urls[name], '/recipe')
+            counts[name][0 if content is not None else 1] += 1
+
+    workers = [threading.Thread(target=crawl, args=(name,)) for name in urls for _ in range(WORKERS_PER_HOST)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    failed = False
+    for name, url in urls.items():
+        ok, errors = counts[name]
+        rate = errors / max(ok + errors, 1)
+        limit = web_crawler.LIMITER.limit(url[len('http://'):])
+        capacity = HOSTS.get(name, (0,))[0]
+        print(f'{name.ljust(12)}: capacity {capacity:3}  {ok / seconds:8.1f} pages/s  '
+              f'{rate * 100:5.1f}% errors  limit {limit:5.1f}')
+        if name in HOSTS and rate > 0.2:
+            print(f'The {name} was throttled too often.')
+            failed = True
+    print(f'total       : {sum(ok for ok, _ in counts.values()) / seconds:8.1f} pages/s  '
+          f'global limit {web_crawler.LIMITER.global_limit:.1f}')
+
+    limits = {name: web_crawler.LIMITER.limit(url[len('http://'):]) for name, url in urls.items()}
+    if limits['cdn'] <= limits['small blog']:
+        print('The fast host was not given more concurrency than the small one.')
+        failed = True
+    if web_crawler.LIMITER.global_limit < initial_global_limit:
+        print('The dead host decreased the global limit.')
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(float(sys.argv[1]) if len(sys.argv) > 1 else 10))
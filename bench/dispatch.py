@@ -0,0 +1,56 @@
+"""
+Micro-benchmark of the command dispatch of the snake and of the console.
+
+Usage: python bench/dispatch.py (actions) (commands)
+
+The snake learns the given amount of actions (1000 by default), then the
+learning, the parsing and the dispatch of the given amount of scripted
+commands (100000 by default) are timed. The console dispatch is timed the
+same way with its registered commands.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import console
+from snake import Snake
+
+
+def timed(name: str, count: int, operation):
+    started = time.perf_counter()
+    operation()
+    elapsed = time.perf_counter() - started
+    print(f'{name.ljust(28)}: {elapsed:7.3f} s  {elapsed / count * 1e6:8.2f} us/op')
+
+
+def noop(*values, **kwargs):
+    pass
+
+
+def main(actions: int = 1000, commands: int = 100000):
+    snake = Snake()
+
+    def learn():
+        for i in range(actions):
+            snake.learn(f'action{i}', noop, 'A benchmark action.', f'action{i} <url> (depth)')
+
+    timed(f'learn {actions} actions', actions, learn)
+
+    lines = [f'action{i % actions} https://example.com/{i} depth=2 label="a quoted value"'
+             for i in range(commands)]
+    timed('parse commands', commands, lambda: [snake._process_command_input(line) for line in lines])
+    timed('parse and perform commands', commands, lambda: [snake.perform(line) for line in lines])
+
+    # The console commands are module functions using the module 'console' instance.
+    console.console = console.Console(console.COMMANDS)
+    console.cmd_benchmark = noop
+    console.console.add_command(('benchmark', 'A benchmark command.', 'benchmark', ''))
+    console_lines = [f'benchmark https://example.com/{i} 2' for i in range(commands)]
+    timed('console execute commands', commands,
+          lambda: [console.console.execute(line) for line in console_lines])
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:3]))
@@ -0,0 +1,61 @@
+"""
+Throughput of the streaming file operations on a large file.
+
+Usage: python bench/file_ops.py (size_mb)
+
+A file of the given size (200 MB by default) is generated in a temporary
+directory, then the replacement and the export of a lazy clipboard are timed.
+The peak memory of the process is reported to check that it does not grow
+with the size of the file.
+"""
+import os
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data import data_saver
+
+
+def peak_memory_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # The peak is in bytes on macOS and in kilobytes on Linux.
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def timed(name: str, size: int, operation):
+    started = time.perf_counter()
+    result = operation()
+    elapsed = time.perf_counter() - started
+    print(f'{name.ljust(24)}: {elapsed:7.2f} s  {size / (1024 * 1024) / elapsed:8.1f} MB/s  '
+          f'peak memory {peak_memory_mb():7.1f} MB')
+    return result
+
+
+def main(size_mb: int = 200):
+    line = 'https://www.example.com/recipes/chocolate-cake-with-strawberries\n'
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, 'urls.txt')
+        with open(source, 'w') as f:
+            block = line * 10000
+            for _ in range(size_mb * 1024 * 1024 // len(block)):
+                f.write(block)
+        size = os.path.getsize(source)
+        print(f'File of {size / (1024 * 1024):.0f} MB, peak memory before {peak_memory_mb():.1f} MB')
+
+        replacements = timed('replace', size, lambda: data_saver.replaceInFile(source, 'example.com', 'example.org'))
+        assert replacements == size // len(line)
+
+        reference = data_saver.FileReference(source)
+        timed('export (chunks)', size,
+              lambda: data_saver.writeInFile(os.path.join(directory, 'chunks.txt'), reference, False))
+        reference = data_saver.FileReference(source, True)
+        timed('export (lines)', size,
+              lambda: data_saver.writeInFile(os.path.join(directory, 'lines.txt'), reference, False))
+        timed('export (into itself)', size, lambda: data_saver.writeInFile(source, reference, False))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -0,0 +1,76 @@
+"""
+Throughput of the sitemap urls extraction and of the robots.txt parser.
+
+Usage: python bench/sitemap_extraction.py (urls)
+
+Fixture sitemaps with the given amount of urls (200000 by default) are
+generated in memory: a flat sitemap, a flat sitemap with escaped urls and
+an image sitemap. The byte-level scanner is timed on each of them and
+compared to the full XML parser (BeautifulSoup) when it is installed.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data import web_crawler
+
+
+def fixture(urls: int, escaped: bool = False, images: bool = False) -> bytes:
+    parts = [b'<?xml version="1.0" encoding="UTF-8"?>\n'
+             b'<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9" '
+             b'xmlns:image="http://www.google.com/schemas/sitemap-image/1.1">\n']
+    for i in range(urls):
+        query = b'?page=1&amp;sort=new' if escaped else b''
+        image = b'<image:image><image:loc>https://example.com/%d.jpg</image:loc></image:image>' % i \
+            if images else b''
+        parts.append(b'<url><loc>https://www.example.com/recipes/%d-chocolate-cake%s</loc>'
+                     b'<lastmod>2020-01-01</lastmod>%s</url>\n' % (i, query, image))
+    parts.append(b'</urlset>\n')
+    return b''.join(parts)
+
+
+def timed(name: str, content: bytes, extract) -> float:
+    started = time.perf_counter()
+    urls = extract(content)
+    elapsed = time.perf_counter() - started
+    print(f'{name.ljust(32)}: {elapsed:7.3f} s  {len(urls) / elapsed:12.0f} urls/s  '
+          f'{len(content) / (1024 * 1024) / elapsed:8.1f} MB/s')
+    return elapsed
+
+
+def parse_with_xml_tree(content: bytes) -> list:
+    from bs4 import BeautifulSoup
+
+    return [tag.get_text().strip() for tag in BeautifulSoup(content, 'xml').find_all('loc')]
+
+
+def main(urls: int = 200000):
+    try:
+        import bs4
+        has_xml_tree = True
+    except ImportError:
+        print('BeautifulSoup is not installed, the full XML parser is not compared.')
+        has_xml_tree = False
+
+    for name, content in (('flat', fixture(urls)), ('escaped', fixture(urls, escaped=True)),
+                          ('images', fixture(urls, images=True))):
+        assert len(web_crawler.scan_sitemap_locs(content)) == urls
+        scanned = timed(f'scan {name} sitemap', content, web_crawler.scan_sitemap_locs)
+        if has_xml_tree:
+            parsed = timed(f'xml tree {name} sitemap', content, parse_with_xml_tree)
+            print(f'{"speedup".ljust(32)}: {parsed / scanned:.1f}x')
+
+    robots = ('\ufeffUser-agent: *\r\nDisallow: /search # comment\r\nAllow: /recipes\r\n'
+              'User-agent: Googlebot\r\nCrawl-delay: 2\r\n') * (urls // 10) \
+        + 'Sitemap: https://www.example.com/sitemap.xml\r\n'
+    started = time.perf_counter()
+    web_crawler.parse_robots(robots)
+    elapsed = time.perf_counter() - started
+    print(f'{"parse robots.txt".ljust(32)}: {elapsed:7.3f} s  '
+          f'{robots.count(chr(10)) / elapsed:12.0f} lines/s')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200000)
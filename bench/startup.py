@@ -0,0 +1,59 @@
+"""
+Startup time guard of the console.
+
+Usage: python bench/startup.py (threshold_ms)
+
+The console is imported in fresh interpreters with 'python -X importtime'
+and the best cumulative import time of the console module is compared to
+the threshold (60 ms by default). The heavy modules that must only be
+imported on first use are checked too. The script exits with 1 if the
+import is too slow or if one of these modules is imported at startup.
+"""
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The modules that must not be imported by a command that does not need them.
+LAZY_MODULES = ('bs4', 'sqlite3', 'asyncio', 'gzip', 'concurrent.futures', 'urllib.request',
+                'data.web_crawler', 'data.catalog', 'data.recipe_extractor')
+
+RUNS = 5
+
+
+def import_time_us() -> int:
+    """Get the cumulative import time of the console in a fresh interpreter."""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import console'],
+                            cwd=ROOT, capture_output=True, text=True, check=True)
+    for line in result.stderr.splitlines():
+        parts = line.split('|')
+        if len(parts) == 3 and parts[2].strip() == 'console':
+            return int(parts[1])
+    raise RuntimeError('Could not find the import time of the console:\n' + result.stderr)
+
+
+def imported_lazy_modules() -> list:
+    """Get the lazy modules imported by the console at startup."""
+    check = f'import sys, console; print(" ".join(m for m in {LAZY_MODULES!r} if m in sys.modules))'
+    result = subprocess.run([sys.executable, '-c', check], cwd=ROOT, capture_output=True, text=True, check=True)
+    return result.stdout.split()
+
+
+def main(threshold_ms: float = 60) -> int:
+    best_ms = min(import_time_us() for _ in range(RUNS)) / 1000
+    imported = imported_lazy_modules()
+    print(f'console import time: {best_ms:.1f} ms (threshold {threshold_ms:.0f} ms)')
+
+    failed = False
+    if best_ms > threshold_ms:
+        print('The console is too slow to import.')
+        failed = True
+    if len(imported) > 0:
+        print('Modules imported at startup instead of on first use: ' + ', '.join(imported))
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(float(sys.argv[1]) if len(sys.argv) > 1 else 60))
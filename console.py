@@ -23,25 +23,74 @@ Console system:
 
 
 """
-from typing import Tuple, List, Union
+from typing import Tuple, List, Union, Iterable
 import os
 import platform
+import sys
+import threading
+from urllib.parse import urlsplit
 
 from data import data_saver
-from data import web_crawler
+from logger import LOGGER
+
+# The modules of the commands (and their heavy dependencies such as the
+# HTML/XML parsers) are imported on first use to keep the startup fast.
+
+# The exit codes of the commands and of the scripts.
+EXIT_SUCCESS = 0
+EXIT_FAILURE = 1
+EXIT_USAGE = 2
+EXIT_NOT_FOUND = 127
 
 
 class Console:
 
     def __init__(self, commands: List[Tuple[str, str, str, str]]):
         self.commands = commands
-        self.clipboard = None
+        self._clipboard = None
         self.log_level = 3
 
+        # The state of the step run by the current thread. A background step
+        # of a script has its own clipboard, see #run_script.
+        self._step = threading.local()
+
+        # The commands and their functions indexed by their name.
+        self._index = {cmd[0]: cmd for cmd in commands}
+        self._calls = {}
+
+    @property
+    def clipboard(self):
+        """The clipboard of the current step, which is the console's clipboard
+        unless the step is run in the background by a script."""
+        if getattr(self._step, 'private', False):
+            return self._step.clipboard
+        return self._clipboard
+
+    @clipboard.setter
+    def clipboard(self, value):
+        if getattr(self._step, 'private', False):
+            self._step.clipboard = value
+        else:
+            self._clipboard = value
+
     def input(self) -> str:
+        # The previous outputs are written before the prompt.
+        LOGGER.flush()
         user_input = input('> ')
+        self.execute(user_input)
+        return user_input
+
+    def execute(self, user_input: str) -> int:
+        """Execute a command line without any user interaction.
+
+        :param user_input: The command line to execute.
+        :return: The exit code of the command. It is EXIT_SUCCESS if the command
+                 succeeded, EXIT_NOT_FOUND if it does not exist, EXIT_USAGE if
+                 its parameters were wrong and EXIT_FAILURE if it returned False
+                 or raised an exception.
+        """
         if len(user_input) == 0:
-            return user_input
+            return EXIT_SUCCESS
 
         cmd_attributes = user_input.split(' ')
 
@@ -61,27 +110,92 @@ class Console:
                 key_value_pattern = False
                 break
 
-        try:
+        call = self._calls.get(cmd_name)
+        if call is None:
             call = globals().get('cmd_' + cmd_name)
-            if call is None or not callable(call):
-                raise AttributeError
-        except AttributeError:
+            if call is not None and callable(call):
+                self._calls[cmd_name] = call
+        if call is None or not callable(call):
             self.warn(f"The command with the name {cmd_name} was not found.\n"
                       f"Type 'help' to see the list of the available commands.")
-            return user_input
+            return EXIT_NOT_FOUND
         try:
             if not key_value_pattern:
-                call(*cmd_args)
+                result = call(*cmd_args)
             else:
                 kwargs = {}
                 for i in range(len(cmd_args)):
                     key_value = cmd_args[i].split('=', 1)
                     kwargs.update({key_value[0][1:]: key_value[1]})
 
-                call(**kwargs)
+                result = call(**kwargs)
         except TypeError:
-            console.error('Please use the command parameters: \n     ' + self.get_command(cmd_name)[2])
-        return user_input
+            self.error('Please use the command parameters: \n     ' + self.get_command(cmd_name)[2])
+            return EXIT_USAGE
+        except Exception as err:
+            # A failing command must not stop the console nor a script run by cron.
+            self.error(f'The command {cmd_name} failed: {type(err).__name__}: {err}')
+            return EXIT_FAILURE
+        return EXIT_FAILURE if result is False else EXIT_SUCCESS
+
+    def run_script(self, lines: Iterable[str]) -> int:
+        """Execute the command lines of a script one after the other.
+
+        Empty lines and lines starting with '#' are ignored. A line ending
+        with ' &' is run in the background so that the following lines do not
+        wait for it. The background commands are joined by a 'wait' line or at
+        the end of the script. The script stops at the first failing command.
+
+        A background command has its own clipboard, which starts as the clipboard
+        when its line is read and is discarded once the command is done, so that
+        concurrent commands never overwrite each other's data. The data of a
+        background command is passed to the following steps through the files
+        it writes (e.g. 'sitemap <exportFile>' followed by 'load <exportFile>').
+        :param lines: The command lines of the script. They are read lazily.
+        :return: The exit code of the first failing command or EXIT_SUCCESS.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        background = []
+        with ThreadPoolExecutor() as executor:
+
+            def join() -> int:
+                codes = [job.result() for job in background]
+                background.clear()
+                return next((code for code in codes if code != EXIT_SUCCESS), EXIT_SUCCESS)
+
+            for line in lines:
+                line = line.strip()
+                if len(line) == 0 or line.startswith('#'):
+                    continue
+
+                if line == 'wait':
+                    code = join()
+                elif line.endswith(' &'):
+                    background.append(executor.submit(self._execute_step, line[:-2].rstrip(), self.clipboard))
+                    continue
+                else:
+                    code = self.execute(line)
+
+                if code != EXIT_SUCCESS:
+                    join()
+                    return code
+            return join()
+
+    def _execute_step(self, user_input: str, clipboard) -> int:
+        """Execute a command line in the background with its own clipboard.
+
+        :param user_input: The command line to execute.
+        :param clipboard:  The initial value of the clipboard of the step.
+        :return: The exit code of the command.
+        """
+        self._step.private = True
+        self._step.clipboard = clipboard
+        try:
+            return self.execute(user_input)
+        finally:
+            self._step.private = False
+            self._step.clipboard = None
 
     def get_command(self, command: str) -> tuple:
         """Get a command that have been registered.
@@ -95,19 +209,15 @@ class Console:
         if len(cmd_attributes) == 0:
             return self.commands[0]
 
-        cmd_name = cmd_attributes[0]
-
-        for cmd in self.commands:
-            if cmd[0] == cmd_name:
-                return cmd
-        return self.commands[0]
+        return self._index.get(cmd_attributes[0], self.commands[0])
 
     def output(self, obj, prefix: str = '', level: int = 0, copyInClipboard: bool = False):
         """Prints a value in the console.
 
         The last raw input is set to the given object. The given object
-        to output is formatted if it is not a string. Then, it prints the
-        tag followed by the object serialized value.
+        to output is serialized if it is not a string, only if the level is
+        enabled and by the logger's writer thread. Then, it prints the tag
+        followed by the object serialized value.
         :param copyInClipboard: A boolean value of true to copy the content in the clipboard.
         :param level:   The level of the output importance. The more the output is
                         high, the less it is important.
@@ -116,14 +226,17 @@ class Console:
         """
         if copyInClipboard:
             self.clipboard = obj
-        serialized = obj
 
         if level > self.log_level:
             return
 
-        if not isinstance(obj, str):
-            serialized = data_saver.serialize(obj)
-        print(prefix + serialized)
+        if isinstance(obj, str):
+            LOGGER.log(level, obj, prefix=prefix)
+        elif isinstance(obj, data_saver.FileReference):
+            # The referenced content is never read to be printed.
+            LOGGER.log(level, '%s', obj, prefix=prefix)
+        else:
+            LOGGER.log(level, lambda: data_saver.serialize(obj), prefix=prefix)
 
     def info(self, obj):
         self.output(obj, '[INFO] ', 3)
@@ -151,10 +264,11 @@ class Console:
         :param attributes: The attributes of the command (name, description, usage).
         :return: A boolean value of true if the command was successfully added.
         """
-        if self.get_command(attributes[0]) == '':
+        if attributes[0] in self._index:
             return False
         else:
             self.commands.append(attributes)
+            self._index[attributes[0]] = attributes
             return True
 
     def remove_command(self, name: str) -> bool:
@@ -164,12 +278,12 @@ class Console:
         :return: A boolean value of true if the command was removed.
                  False is returned otherwise.
         """
-        command = self.get_command(name)
-        try:
-            self.commands.remove(command)
-            return True
-        except ValueError:
+        command = self._index.pop(name, None)
+        if command is None:
             return False
+        self._calls.pop(name, None)
+        self.commands.remove(command)
+        return True
 
 
 # Command pattern -> name, description, usage.
@@ -179,25 +293,51 @@ COMMANDS = [
     ('quit', 'Quit the program.', 'quit', ''),
     ('clear', 'Clear the content of the console.', 'clear', ''),
     ('clipboard', 'See or clear the actual clipboard value.', 'clipboard (clear)', ''),
-    ('load', 'Load the content of a file in memory.', 'load <path>', ''),
+    ('load', 'Reference the content of a file in the clipboard.', 'load <path> (array_type)', ''),
     ('export', 'Export the content of the clipboard in a file.', 'export <path>', ''),
     ('replace', 'Replace content in a file.', 'replace <path> <str_from> <str_to>', ''),
-    ('sitemap', 'Find the sitemap(s) of one or many websites.', 'sitemap <exportFile> <urls>', '@urls '
+    ('sitemap', 'Find the sitemap(s) of one or many websites.', 'sitemap <exportFile> <urls> (workers)', '@urls '
                                                                 'may be a file with a link '
                                                                 'on every line or \n'
                                                                 'urls separated by | character '
-                                                                'with inline command.')
+                                                                'with inline command.'),
+    ('catalog', 'Query the crawl catalog.', 'catalog (query)', '@query may be stats, sitemaps, nositemap, urls, '
+                                                              'failed or recipes.\n'
+                                                              'The catalog is the file catalog.db unless '
+                                                              'the CRAWL_CATALOG environment variable\n'
+                                                              'gives another path, or is empty to disable it.'),
+    ('recipe', 'Extract the recipe embedded in the state of a page.', 'recipe <url>', '')
 ]
 
 CONSOLE = None
 PLATFORM = 'Windows'
 
+# The crawl catalog is opened on first use. Its path is given by the CRAWL_CATALOG
+# environment variable, which disables the catalog if it is empty.
+CATALOG_PATH = os.environ.get('CRAWL_CATALOG', 'catalog.db')
+CATALOG = None
+
+
+def get_catalog():
+    """Get the crawl catalog and record every request of the crawler into it.
+
+    :return: The crawl catalog or None if it is disabled.
+    """
+    global CATALOG
+    if CATALOG is None and len(CATALOG_PATH) > 0:
+        from data import catalog
+        from data import web_crawler
+
+        CATALOG = catalog.Catalog(CATALOG_PATH)
+        web_crawler.FETCH_LISTENERS.append(CATALOG.add_fetch)
+    return CATALOG
+
 
 def cmd_help(cmd: str = '', show_usage: str = ''):
     command = console.get_command(cmd)
     if cmd != '' and command[0] == '':
         console.output(f"There is no registered command named '{cmd}'")
-        return
+        return False
 
     if cmd == '':
         console.output('Here is the list of all the commands:\n')
@@ -215,6 +355,7 @@ def cmd_quit():
 
 
 def cmd_clear():
+    LOGGER.flush()
     if PLATFORM == 'Windows':
         os.system('cls')
     else:
@@ -222,21 +363,22 @@ def cmd_clear():
 
 
 def cmd_load(path: str, array_type: str = 'false'):
-    content = data_saver.retrieveFileContent(path, True if array_type == 'true' else False)
+    # The clipboard only references the file so that large files are never held in memory.
+    content = data_saver.FileReference(path, True if array_type == 'true' else False)
+    size = content.size()
 
-    if content is None:
+    if size == -1:
         console.error(f'Could not load the following file: {path}')
-        return
+        return False
 
     console.clipboard = content
-    size = len(content)
-    console.info(f'The content of the file has been copied in the clipboard. ({size} characters)')
+    console.info(f'The content of the file has been referenced in the clipboard. ({size} bytes)')
 
 
 def cmd_export(path: str, append: str = 'true', line_sep: str = '\n'):
     if console.clipboard is None:
         console.error('Could not export the content of the clipboard because it is empty.')
-        return
+        return False
     data_saver.writeInFile(path, console.clipboard, True if append == 'true' else False, line_sep)
     console.info(f'Pasted the content of the clipboard into the following file: {path}')
 
@@ -250,44 +392,102 @@ def cmd_clipboard(option: str = ''):
 
 
 def cmd_replace(path: str, str_from: str, str_to: str):
-    content = data_saver.retrieveFileContent(path)
+    replacements = data_saver.replaceInFile(path, str_from, str_to)
 
-    if content is None:
-        console.error(f'Could not load the content of the following file: {path}')
+    if replacements is None:
+        console.error(f'Could not replace the content of the following file: {path}')
         return False
 
-    data_saver.writeInFile(path, content.replace(str_from, str_to), False)
-    console.info(f'The replacements have been made in the following file: {path}')
+    console.info(f'{replacements} replacements have been made in the following file: {path}')
 
 
 LAST_SITEMAP = False
 
-def cmd_sitemap(exportFile: str, urls: str):
+def cmd_sitemap(exportFile: str, urls: str, workers: str = '64'):
+    from data import web_crawler
 
     if urls.startswith('http'):
         urls = urls.split('|')
     else:
-        urls = data_saver.retrieveFileContent(urls, True)
-        if urls is None:
+        if not os.path.isfile(urls):
             console.error(f'Could not load the content of the following file: {urls}')
             return False
+        # The urls are read lazily from the file, one line at a time.
+        urls = (url for url in data_saver.iterFileLines(urls) if len(url) > 0)
 
-    if urls is None or len(urls) == 0:
-        console.error(f'Could not load the urls in {urls}')
-        return
+    if not workers.isdigit() or int(workers) == 0:
+        console.error(f'The amount of workers must be a positive number: {workers}')
+        return False
 
-    data = []
-    for url in urls:
-        sm = web_crawler.find_sitemaps_url(url)
-        if sm is not None:
-            data.append(sm)
+    # The websites are searched at once and every found sitemap list is written as soon as it is found.
+    catalog = get_catalog()
+    found = 0
+    with open(exportFile, 'w') as export:
+        for url, sm in web_crawler.discover_sitemaps(urls, int(workers)):
+            host = urlsplit(url).netloc
+            if sm is not None:
+                export.write(str(sm[0]) + '\n')
+                export.flush()
+                if catalog is not None:
+                    catalog.add_sitemaps(host, sm[0])
+                    # The pages are listed directly when the found sitemap is not an index.
+                    catalog.add_urls(host, sm[1], sm[0][0] if len(sm[1]) > 0 else None)
+                found += 1
+            elif catalog is not None and len(host) > 0:
+                catalog.add_host(host)
+
+    if found == 0:
+        console.error('Could not find any sitemap for the given urls.')
+        return False
 
-    console.clipboard = data
-    console.info('Copied the sitemap list to the clipboard.')
-    data_saver.writeInFile(exportFile, data, False)
+    console.clipboard = data_saver.FileReference(exportFile, True)
+    console.info('Referenced the sitemap list in the clipboard.')
     console.info(f'Sitemap list exported into the file {exportFile}')
 
 
+def cmd_catalog(query: str = 'stats'):
+    from data import catalog
+
+    if query not in catalog.QUERIES:
+        console.error(f"There is no catalog query named '{query}'")
+        return False
+
+    crawl_catalog = get_catalog()
+    if crawl_catalog is None:
+        console.error('The crawl catalog is disabled by the CRAWL_CATALOG environment variable.')
+        return False
+
+    # The rows queued by the crawler are inserted before querying.
+    crawl_catalog.flush()
+    rows = crawl_catalog.query(query)
+    console.clipboard = rows
+    for row in rows:
+        console.output(' | '.join(str(value) for value in row))
+    console.info(f'Copied the {len(rows)} rows of the query in the clipboard.')
+
+
+def cmd_recipe(url: str):
+    from data import recipe_extractor
+    from data import web_crawler
+
+    # The catalog records the fetch of the page.
+    catalog = get_catalog()
+    content = web_crawler.retrieveWebContent(url)
+    if content is None:
+        console.error(f'Could not load the content of the following url: {url}')
+        return False
+
+    recipe = recipe_extractor.extract_recipe(url, content)
+    if recipe is None:
+        console.error(f'Could not find any embedded recipe in the following url: {url}')
+        return False
+
+    if catalog is not None:
+        catalog.add_recipe(url, urlsplit(url).netloc, recipe)
+    console.clipboard = recipe
+    console.info('Copied the recipe to the clipboard.')
+
+
 # sitemap ./test.txt ./urls.txt
 
 if __name__ == '__main__':
@@ -296,6 +496,16 @@ if __name__ == '__main__':
         PLATFORM = 'Linux/OSX'
 
     console = Console(COMMANDS)
+
+    # A script given as argument is run without any user interaction: console.py <script|->
+    if len(sys.argv) > 1:
+        if sys.argv[1] == '-':
+            sys.exit(console.run_script(sys.stdin))
+        if not os.path.isfile(sys.argv[1]):
+            console.error(f'Could not load the following script: {sys.argv[1]}')
+            sys.exit(EXIT_FAILURE)
+        sys.exit(console.run_script(data_saver.iterFileLines(sys.argv[1])))
+
     while True:
         console.input()
 
@@ -0,0 +1,171 @@
+"""
+Local SQLite catalog of the crawled hosts, sitemaps, urls, fetches and recipes.
+
+The rows are queued by the crawler and inserted by a single writer thread in
+batched transactions, so that a concurrent crawl never waits on the disk.
+The database uses the WAL journal so that it can be queried during a crawl.
+"""
+from typing import Union, List, Tuple
+import atexit
+import json
+import queue
+import sqlite3
+import threading
+import time
+
+from logger import LOGGER
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS hosts (
+    name TEXT PRIMARY KEY,
+    first_seen REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sitemaps (
+    url TEXT PRIMARY KEY,
+    host TEXT NOT NULL,
+    found_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sitemaps_host ON sitemaps (host);
+CREATE TABLE IF NOT EXISTS urls (
+    url TEXT PRIMARY KEY,
+    host TEXT NOT NULL,
+    sitemap TEXT
+);
+CREATE INDEX IF NOT EXISTS urls_host ON urls (host);
+CREATE TABLE IF NOT EXISTS fetches (
+    url TEXT NOT NULL,
+    host TEXT NOT NULL,
+    status INTEGER,
+    latency REAL,
+    error TEXT,
+    fetched_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS fetches_url_time ON fetches (url, fetched_at);
+CREATE INDEX IF NOT EXISTS fetches_status ON fetches (status);
+CREATE TABLE IF NOT EXISTS recipes (
+    url TEXT PRIMARY KEY,
+    host TEXT NOT NULL,
+    data TEXT NOT NULL,
+    extracted_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS recipes_host ON recipes (host);
+'''
+
+INSERT_HOST = 'INSERT OR IGNORE INTO hosts (name, first_seen) VALUES (?, ?)'
+INSERT_SITEMAP = 'INSERT OR IGNORE INTO sitemaps (url, host, found_at) VALUES (?, ?, ?)'
+INSERT_URL = 'INSERT OR IGNORE INTO urls (url, host, sitemap) VALUES (?, ?, ?)'
+INSERT_FETCH = 'INSERT INTO fetches (url, host, status, latency, error, fetched_at) VALUES (?, ?, ?, ?, ?, ?)'
+INSERT_RECIPE = 'INSERT OR REPLACE INTO recipes (url, host, data, extracted_at) VALUES (?, ?, ?, ?)'
+
+# The queries that can be run by their name from the console.
+QUERIES = {
+    'stats': "SELECT 'hosts', COUNT(*) FROM hosts UNION ALL SELECT 'sitemaps', COUNT(*) FROM sitemaps "
+             "UNION ALL SELECT 'urls', COUNT(*) FROM urls UNION ALL SELECT 'fetches', COUNT(*) FROM fetches "
+             "UNION ALL SELECT 'recipes', COUNT(*) FROM recipes",
+    'sitemaps': 'SELECT host, COUNT(*) FROM sitemaps GROUP BY host ORDER BY host',
+    'nositemap': 'SELECT name FROM hosts WHERE name NOT IN (SELECT host FROM sitemaps) ORDER BY name',
+    # The urls whose latest fetch failed.
+    'failed': 'SELECT fetches.url, status, error, fetched_at FROM fetches JOIN '
+              '(SELECT url, MAX(fetched_at) AS latest FROM fetches GROUP BY url) AS latest_fetches '
+              'ON fetches.url = latest_fetches.url AND fetches.fetched_at = latest_fetches.latest '
+              'WHERE status IS NULL OR status >= 400 ORDER BY fetches.url',
+    'urls': 'SELECT host, COUNT(*) FROM urls GROUP BY host ORDER BY host',
+    'recipes': 'SELECT host, COUNT(*) FROM recipes GROUP BY host ORDER BY host',
+}
+
+
+class Catalog:
+    """A crawl catalog stored in a SQLite database.
+
+    The add_* methods only queue the rows, which are inserted by the writer
+    thread in transactions of at most #batch_size rows. Call #flush to wait
+    until every queued row has been inserted.
+    """
+
+    def __init__(self, path: str, batch_size: int = 5000, max_queued: int = 100000):
+        """
+        :param path:       The path of the database file.
+        :param batch_size: The maximum amount of rows inserted in a transaction.
+        :param max_queued: The maximum amount of rows waiting to be inserted. The
+                           crawler waits when there are more rows than that.
+        """
+        self.path = path
+        self.batch_size = batch_size
+        self._queue = queue.Queue(max_queued)
+
+        connection = self._connect()
+        connection.executescript(SCHEMA)
+        connection.close()
+
+        self._thread = threading.Thread(target=self._write_forever, name='catalog', daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+
+    def add_host(self, host: str):
+        self._queue.put((INSERT_HOST, (host, time.time())))
+
+    def add_sitemaps(self, host: str, sitemaps: List[str]):
+        self.add_host(host)
+        now = time.time()
+        for sitemap in sitemaps:
+            self._queue.put((INSERT_SITEMAP, (sitemap, host, now)))
+
+    def add_urls(self, host: str, urls: List[str], sitemap: Union[str, None] = None):
+        for url in urls:
+            self._queue.put((INSERT_URL, (url, host, sitemap)))
+
+    def add_fetch(self, url: str, host: str, status: Union[int, None], latency: float,
+                  error: Union[str, None] = None):
+        self._queue.put((INSERT_FETCH, (url, host, status, latency, error, time.time())))
+
+    def add_recipe(self, url: str, host: str, recipe: dict):
+        self._queue.put((INSERT_RECIPE, (url, host, json.dumps(recipe), time.time())))
+
+    def query(self, sql: str, parameters: tuple = ()) -> List[Tuple]:
+        """Run a query on the catalog.
+
+        The queued rows are not flushed first. The query uses its own connection
+        so that it does not wait for the writer thread.
+        :param sql:        The SQL query or the name of one of the #QUERIES.
+        :param parameters: The parameters of the query.
+        :return:           The rows returned by the query.
+        """
+        connection = self._connect()
+        try:
+            return connection.execute(QUERIES.get(sql, sql), parameters).fetchall()
+        finally:
+            connection.close()
+
+    def flush(self):
+        """Wait until every queued row has been inserted."""
+        self._queue.join()
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        return connection
+
+    def _write_forever(self):
+        connection = self._connect()
+        while True:
+            # Wait for a row, then take every row already queued up to the batch size.
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            statements = {}
+            for sql, row in batch:
+                statements.setdefault(sql, []).append(row)
+            try:
+                with connection:
+                    for sql, rows in statements.items():
+                        connection.executemany(sql, rows)
+            except sqlite3.Error as err:
+                LOGGER.log(1, 'Could not insert %s rows in the catalog: %s', len(batch), err, prefix='[ERROR] ')
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
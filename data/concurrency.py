@@ -0,0 +1,169 @@
+"""
+Adaptive control of the amount of requests sent at once.
+
+The amount of requests in flight is tuned for every host and globally from
+the responses of the hosts, like the congestion control of TCP (AIMD). Every
+successful and fast response additively increases the limit while throttling
+responses (429, 503), gateway errors (502, 504), timeouts and a latency that
+grows far above the best latency seen multiplicatively decrease it. The
+latency is the time a host takes to answer, without the download of the body.
+"""
+from typing import Union
+import threading
+import time
+
+# The status codes returned by hosts (or by their gateways) that are throttling
+# the requests or that are overloaded.
+THROTTLING_CODES = (429, 502, 503, 504)
+
+
+class HostState:
+    """The limit and the latency statistics of a single host."""
+
+    def __init__(self, limit: float):
+        self.limit = limit
+        self.in_flight = 0
+        self.latency = None
+        self.best_latency = None
+        self.last_decrease = 0.0
+
+
+class AdaptiveLimiter:
+    """Limit the requests in flight per host and globally with AIMD.
+
+    A request must #acquire a slot before being sent and #release it with
+    its outcome once it is done. The limits never go under the minimum
+    values and never go over the maximum values.
+    """
+
+    def __init__(self, host_limit: float = 2, global_limit: float = 16, min_limit: float = 1,
+                 max_host_limit: float = 64, max_global_limit: float = 1024,
+                 decrease_factor: float = 0.5, latency_tolerance: float = 3.0,
+                 latency_slack: float = 0.05, smoothing: float = 0.2, timeout: float = 30):
+        """
+        :param host_limit:        The initial limit of every host.
+        :param global_limit:      The initial limit of all the hosts together.
+        :param min_limit:         The minimum limit of a host and of all the hosts.
+        :param max_host_limit:    The maximum limit of a host.
+        :param max_global_limit:  The maximum limit of all the hosts together.
+        :param decrease_factor:   The factor applied to a limit when it decreases.
+        :param latency_tolerance: How many times the best latency of a host the
+                                  latency can grow before the limit decreases.
+        :param latency_slack:     The amount of seconds the latency can always grow
+                                  by, so that the noise of fast hosts is ignored.
+        :param smoothing:         The weight of a new latency in the moving average.
+        :param timeout:           The timeout of the requests. It is the minimum amount of
+                                  seconds between two decreases of the global limit and of
+                                  the limit of a host that never answered.
+        """
+        self.initial_host_limit = host_limit
+        self.global_limit = global_limit
+        self.min_limit = min_limit
+        self.max_host_limit = max_host_limit
+        self.max_global_limit = max_global_limit
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+        self.latency_slack = latency_slack
+        self.smoothing = smoothing
+        self.timeout = timeout
+        self.in_flight = 0
+        self._last_global_decrease = 0.0
+        self._hosts = {}
+        self._condition = threading.Condition()
+
+    def acquire(self, host: str, timeout: Union[float, None] = None) -> bool:
+        """Wait until a request can be sent to a host.
+
+        :param host:    The host the request is sent to.
+        :param timeout: The maximum amount of seconds to wait or None to wait forever.
+        :return:        A boolean value of true if the request can be sent.
+        """
+        with self._condition:
+            state = self._hosts.get(host)
+            if state is None:
+                state = self._hosts[host] = HostState(self.initial_host_limit)
+
+            def available() -> bool:
+                return state.in_flight < max(int(state.limit), 1) \
+                    and self.in_flight < max(int(self.global_limit), 1)
+
+            if not self._condition.wait_for(available, timeout):
+                return False
+            state.in_flight += 1
+            self.in_flight += 1
+            return True
+
+    def release(self, host: str, latency: float, status: Union[int, None] = 200, timed_out: bool = False):
+        """Free the slot of a request and adapt the limits to its outcome.
+
+        :param host:      The host the request was sent to.
+        :param latency:   The amount of seconds the host took to answer. It should
+                          not include the download of the body, otherwise the large
+                          responses of a host are taken as a slowdown of the host.
+        :param status:    The HTTP status code of the response or None if
+                          there was no response.
+        :param timed_out: Whether or not the request timed out.
+        """
+        with self._condition:
+            state = self._hosts[host]
+            state.in_flight -= 1
+            self.in_flight -= 1
+
+            if timed_out or status in THROTTLING_CODES:
+                self._decrease(state, timed_out)
+            elif status is not None and status < 500:
+                if state.best_latency is None or latency < state.best_latency:
+                    state.best_latency = latency
+                state.latency = latency if state.latency is None \
+                    else state.latency + self.smoothing * (latency - state.latency)
+
+                # The host is slowing down under the load, it is close to its capacity.
+                if state.latency > state.best_latency * self.latency_tolerance + self.latency_slack:
+                    self._decrease(state, False)
+                else:
+                    state.limit = min(state.limit + 1 / state.limit, self.max_host_limit)
+                    self.global_limit = min(self.global_limit + 1 / self.global_limit, self.max_global_limit)
+            self._condition.notify_all()
+
+    def raise_global_limit(self, limit: float):
+        """Raise the global limit to at least a given value.
+
+        This is used by the callers that start many requests at once, so that
+        they do not wait for the global limit to grow from its initial value.
+        :param limit: The minimum global limit, e.g. the amount of workers.
+        """
+        with self._condition:
+            self.global_limit = min(max(self.global_limit, limit), self.max_global_limit)
+            self._condition.notify_all()
+
+    def limit(self, host: str) -> float:
+        """Get the current limit of a host.
+
+        :param host: The host to get the limit of.
+        :return:     The limit of the host or the initial limit if it is unknown.
+        """
+        with self._condition:
+            state = self._hosts.get(host)
+            return self.initial_host_limit if state is None else state.limit
+
+    def _decrease(self, state: HostState, congested: bool):
+        """Multiplicatively decrease the limit of a host.
+
+        The limit of a host decreases at most once per latency of the host (or per
+        timeout if it never answered), so that the responses of the requests sent
+        before the decrease are not counted twice. The global limit decreases at
+        most once per timeout, whatever the amount of hosts timing out at once.
+        :param state:     The state of the host to decrease the limit of.
+        :param congested: Whether or not the global limit should decrease too.
+                          A throttling host does not slow down the other hosts
+                          but timeouts may come from our own network.
+        """
+        now = time.monotonic()
+        if now - state.last_decrease >= (state.latency if state.latency is not None else self.timeout):
+            state.last_decrease = now
+            state.limit = max(state.limit * self.decrease_factor, self.min_limit)
+
+        # A host that never answered is most likely dead, its timeouts say nothing about our network.
+        if congested and state.latency is not None and now - self._last_global_decrease >= self.timeout:
+            self._last_global_decrease = now
+            self.global_limit = max(self.global_limit * self.decrease_factor, self.min_limit)
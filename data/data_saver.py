@@ -1,5 +1,51 @@
-from typing import Union
+from typing import Union, Iterator
 import json
+import os
+
+from logger import LOGGER
+
+# The amount of characters read at once when streaming a file.
+CHUNK_SIZE = 1024 * 1024
+
+
+class FileReference:
+    """ A lazy reference to the content of a file.
+
+    The content of the file is never held in memory. It is read
+    chunk by chunk (or line by line) every time the reference is
+    iterated over, which makes it suitable for very large files.
+    """
+
+    def __init__(self, path: str, array_type: bool = False, chunk_size: int = CHUNK_SIZE):
+        """
+        :param path:       The path of the referenced file.
+        :param array_type: Whether or not the content should be iterated
+                           over as the lines of the file.
+        :param chunk_size: The amount of characters read at once when
+                           the content is not iterated as lines.
+        """
+        self.path = path
+        self.array_type = array_type
+        self.chunk_size = chunk_size
+
+    def __iter__(self) -> Iterator[str]:
+        if self.array_type:
+            return iterFileLines(self.path)
+        return iterFileChunks(self.path, self.chunk_size)
+
+    def __str__(self) -> str:
+        return f'Reference to {self.path} ({self.size()} bytes)'
+
+    def size(self) -> int:
+        """ Get the size of the referenced file in bytes.
+
+        :return: The size of the file or -1 if it could not be reached
+                 or if it is not a file (e.g. a directory).
+        """
+        try:
+            return os.path.getsize(self.path) if os.path.isfile(self.path) else -1
+        except OSError:
+            return -1
 
 
 def arrayToString(var: Union[list, tuple], separator: str = '') -> str:
@@ -28,6 +74,36 @@ def writeInFile(file: str, data: Union[str, list, tuple], append: bool, array_se
     :param array_separator: The separator used between each item if the data
                             is in array format.
     """
+    if isinstance(data, FileReference):
+        # The chunks keep their line endings, they must be written untranslated.
+        newline = None if data.array_type else ''
+
+        # The referenced file can not be read while it is written, so it is rewritten
+        # through a temporary file that replaces it once the content is complete.
+        if os.path.realpath(file) == os.path.realpath(data.path):
+            import shutil
+            import tempfile
+
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.realpath(file)), prefix='.export-')
+            os.close(fd)
+            try:
+                if append:
+                    shutil.copyfile(file, temp_path)
+                with open(temp_path, 'a' if append else 'w', newline=newline) as out:
+                    for item in data:
+                        out.write(item + array_separator if data.array_type else item)
+                shutil.copymode(file, temp_path)
+                os.replace(temp_path, file)
+            finally:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+            return
+
+        with open(file, 'a' if append else 'w', newline=newline) as file:
+            for item in data:
+                file.write(item + array_separator if data.array_type else item)
+        return
+
     if type(data) != str:
         data = arrayToString(data, array_separator)
 
@@ -52,8 +128,94 @@ def retrieveFileContent(file: str, array_return: bool = False) -> Union[None, st
             f.close()
         return fileContent if not array_return else fileContent.split('\n')
     except OSError as err:
-        print(f'Could not load the following file: {file}')
+        LOGGER.log(1, 'Could not load the following file: %s', file, prefix='[ERROR] ', file=file)
+        return None
+
+
+def iterFileChunks(file: str, chunk_size: int = CHUNK_SIZE) -> Iterator[str]:
+    """ Lazily read the content of a file chunk by chunk.
+
+    The line endings are kept untouched so that the chunks can be
+    written back to produce the exact same file.
+    :param file:       The path of the file to read.
+    :param chunk_size: The maximum amount of characters in a chunk.
+    :return:           An iterator over the chunks of the file.
+    """
+    with open(file, 'r', newline='') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
+def iterFileLines(file: str) -> Iterator[str]:
+    """ Lazily read every line of a file without the line separator.
+
+    :param file: The path of the file to read.
+    :return:     An iterator over the lines of the file.
+    """
+    with open(file, 'r') as f:
+        for line in f:
+            yield line[:-1] if line.endswith('\n') else line
+
+
+def replaceInFile(file: str, str_from: str, str_to: str, chunk_size: int = CHUNK_SIZE) -> Union[None, int]:
+    """ Replace every occurrence of a string in a file without loading it in memory.
+
+    The file is read chunk by chunk and the result is written into a temporary
+    file next to it, which then atomically replaces the original file. The end
+    of each chunk that could be the beginning of an occurrence is carried over
+    to the next chunk so that occurrences across chunk boundaries are replaced.
+    :param file:       The path of the file to replace the content into.
+    :param str_from:   The string to search for. It must not be empty.
+    :param str_to:     The string to replace the occurrences with.
+    :param chunk_size: The amount of characters read at once.
+    :return:           The amount of replacements made or None if the
+                       file could not be processed.
+    """
+    if len(str_from) == 0:
+        LOGGER.log(1, 'Could not replace an empty string.', prefix='[ERROR] ')
+        return None
+
+    import shutil
+    import tempfile
+
+    directory = os.path.dirname(os.path.abspath(file))
+    carry_length = len(str_from) - 1
+    replacements = 0
+    try:
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.replace-')
+    except OSError:
+        LOGGER.log(1, 'Could not create a temporary file next to: %s', file, prefix='[ERROR] ', file=file)
+        return None
+
+    try:
+        with open(fd, 'w', newline='') as out:
+            carry = ''
+            for chunk in iterFileChunks(file, chunk_size):
+                # The parts between the occurrences, the last one follows the last occurrence.
+                parts = (carry + chunk).split(str_from)
+                replacements += len(parts) - 1
+                last = parts.pop()
+                if len(parts) > 0:
+                    out.write(str_to.join(parts))
+                    out.write(str_to)
+
+                # Keep the end of the last part that could start an occurrence.
+                keep = max(len(last) - carry_length, 0)
+                out.write(last[:keep])
+                carry = last[keep:]
+            out.write(carry)
+        shutil.copymode(file, temp_path)
+        os.replace(temp_path, file)
+    except (OSError, UnicodeDecodeError):
+        LOGGER.log(1, 'Could not replace the content of the following file: %s', file, prefix='[ERROR] ',
+                   file=file)
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
         return None
+    return replacements
 
 
 def serialize(value) -> str:
@@ -0,0 +1,214 @@
+"""
+Extraction of the recipes embedded as JSON state in the HTML of a page.
+
+Many recipe websites built with Next.js or Nuxt ship the recipe in a JSON
+state blob (__NEXT_DATA__, window.__INITIAL_STATE__...) or in a schema.org
+JSON-LD script instead of the markup. The blobs are found with a scan of
+the HTML and decoded without executing any JavaScript. The recipe fields
+are then read from the blobs with the rules of the domain of the page, or
+with a generic search of a recipe-like object if the domain has no rules.
+"""
+from typing import Union, Dict, Iterator, Tuple
+from urllib.parse import urlsplit
+import json
+import re
+
+# The JSON scripts: <script id="__NEXT_DATA__" type="application/json">...</script>
+SCRIPT_PATTERN = re.compile(r'<script\b([^>]*)>(.*?)</script\s*>', re.IGNORECASE | re.DOTALL)
+# The values of the attributes may be unquoted: <script type=application/json id=__NEXT_DATA__>
+SCRIPT_ID_PATTERN = re.compile(r'\bid\s*=\s*(?:["\']([^"\']+)["\']|([^\s"\'>]+))', re.IGNORECASE)
+SCRIPT_TYPE_PATTERN = re.compile(r'\btype\s*=\s*(["\']?)application/(ld\+)?json\1(?=[\s/]|$)', re.IGNORECASE)
+
+# The state assigned in JavaScript: window.__INITIAL_STATE__ = {...}; or, when the
+# state is serialized in a string literal: window.__INITIAL_STATE__ = JSON.parse("...");
+STATE_PATTERN = re.compile(r'(?:window\.)?(__[A-Z][A-Z0-9_]*__)\s*=\s*(?:(JSON\.parse\(\s*)(?=["\'])|(?=[{\[]))')
+
+# The single-quoted string literals of JavaScript and their escapes that differ from JSON.
+SINGLE_QUOTED_PATTERN = re.compile(r"'((?:[^'\\\n]|\\.)*)'", re.DOTALL)
+JS_ESCAPE_PATTERN = re.compile(r'\\x([0-9a-fA-F]{2})|\\(.)|"', re.DOTALL)
+
+# The rules of the domains. Every recipe field is read from a blob with a path
+# of keys separated by dots, where '*' reads the rest of the path in every item
+# of a list. The domains are matched without their 'www.' prefix.
+DOMAIN_RULES = {
+    # 'example.com': {
+    #     'name': ('__NEXT_DATA__', 'props.pageProps.recipe.title'),
+    #     'ingredients': ('__NEXT_DATA__', 'props.pageProps.recipe.ingredients.*.text'),
+    # },
+}
+
+# The keys read by the generic search for every recipe field, by order of preference.
+# The schema.org keys come first, then the keys commonly used by the states.
+RECIPE_FIELDS = {
+    'name': ('name', 'title'),
+    'ingredients': ('recipeIngredient', 'ingredients'),
+    'instructions': ('recipeInstructions', 'instructions', 'steps'),
+    'image': ('image',),
+    'total_time': ('totalTime',),
+    'yield': ('recipeYield', 'servings'),
+}
+
+_DECODER = json.JSONDecoder()
+
+
+def find_state_blobs(content: str) -> Iterator[Tuple[str, object]]:
+    """ Find and decode the JSON state blobs embedded in the HTML of a page.
+
+    The JSON scripts are named after their id, or 'ld+json' for JSON-LD. The
+    states assigned in JavaScript are decoded from their first character until
+    the end of the JSON value only, so the rest of the script is never parsed.
+    The blobs that are not valid JSON (e.g. the JavaScript of Nuxt) are ignored.
+
+    :param content: The HTML content of the page.
+    :return:        An iterator over the name and the decoded value of every blob.
+    """
+    for match in SCRIPT_PATTERN.finditer(content):
+        attributes, script = match.group(1), match.group(2)
+        json_type = SCRIPT_TYPE_PATTERN.search(attributes)
+        if json_type is not None:
+            script_id = SCRIPT_ID_PATTERN.search(attributes)
+            if json_type.group(2):
+                name = 'ld+json'
+            else:
+                name = (script_id.group(1) or script_id.group(2)) if script_id else 'json'
+            try:
+                yield name, json.loads(script)
+            except ValueError:
+                continue
+            continue
+
+        for state in STATE_PATTERN.finditer(script):
+            try:
+                if state.group(2) is None:
+                    yield state.group(1), _DECODER.raw_decode(script, state.end())[0]
+                else:
+                    yield state.group(1), json.loads(decode_string_literal(script, state.end()))
+            except ValueError:
+                continue
+
+
+def decode_string_literal(script: str, start: int) -> str:
+    """ Decode a JavaScript string literal without executing any JavaScript.
+
+    The double-quoted literals are valid JSON strings. The single-quoted literals
+    are converted to JSON strings first, since their quotes and some of their
+    escapes are not valid JSON.
+
+    :param script: The JavaScript code containing the literal.
+    :param start:  The index of the opening quote of the literal.
+    :return:       The value of the literal.
+    :raise:        A ValueError if the literal could not be decoded.
+    """
+    if script[start] == '"':
+        value = _DECODER.raw_decode(script, start)[0]
+        if not isinstance(value, str):
+            raise ValueError('Not a string literal.')
+        return value
+
+    literal = SINGLE_QUOTED_PATTERN.match(script, start)
+    if literal is None:
+        raise ValueError('Unterminated string literal.')
+
+    def to_json(escape: re.Match) -> str:
+        if escape.group(1) is not None:
+            return '\\u00' + escape.group(1)
+        if escape.group(2) is None:
+            return '\\"'
+        return "'" if escape.group(2) == "'" else escape.group(0)
+
+    return json.loads('"' + JS_ESCAPE_PATTERN.sub(to_json, literal.group(1)) + '"')
+
+
+def read_path(value, path: str):
+    """ Read a value inside a decoded blob.
+
+    :param value: The decoded blob.
+    :param path:  The keys separated by dots. The keys of the lists are their
+                  indexes and '*' reads the rest of the path in every item.
+    :return:      The value at the end of the path or None if it does not exist.
+    """
+    keys = path.split('.') if len(path) > 0 else []
+    for i in range(len(keys)):
+        key = keys[i]
+        if key == '*' and isinstance(value, list):
+            rest = '.'.join(keys[i + 1:])
+            return [item for item in (read_path(item, rest) for item in value) if item is not None]
+        if isinstance(value, dict):
+            value = value.get(key)
+        elif isinstance(value, list) and key.lstrip('-').isdigit() and -len(value) <= int(key) < len(value):
+            value = value[int(key)]
+        else:
+            return None
+        if value is None:
+            return None
+    return value
+
+
+def find_recipe_object(value) -> Union[dict, None]:
+    """ Search for a schema.org recipe or a recipe-like object inside a decoded blob.
+
+    :param value: The decoded blob.
+    :return:      The first object typed as a recipe or having a list of
+                  ingredients and a name, or None.
+    """
+    # The blob is walked without recursion since the states can be very deep.
+    stack = [value]
+    while len(stack) > 0:
+        value = stack.pop()
+        if isinstance(value, dict):
+            recipe_type = value.get('@type')
+            if recipe_type == 'Recipe' or (isinstance(recipe_type, list) and 'Recipe' in recipe_type) \
+                    or 'recipeIngredient' in value:
+                return value
+            if isinstance(value.get('ingredients'), list) and ('name' in value or 'title' in value):
+                return value
+            stack.extend(reversed(list(value.values())))
+        elif isinstance(value, list):
+            stack.extend(reversed(value))
+    return None
+
+
+def extract_recipe(url: str, content: str) -> Union[Dict[str, object], None]:
+    """ Extract a recipe from the embedded state of a page.
+
+    The rules of the domain of the url are used if there are some, otherwise
+    the fields of the first recipe-like object of the blobs are used.
+
+    :param url:     The url of the page.
+    :param content: The HTML content of the page, as returned by #retrieveWebContent.
+    :return:        The fields of the recipe or None if no recipe was found.
+    """
+    domain = urlsplit(url).netloc.lower()
+    if domain.startswith('www.'):
+        domain = domain[4:]
+
+    blobs = {}
+    for name, blob in find_state_blobs(content):
+        blobs.setdefault(name, []).append(blob)
+
+    rules = DOMAIN_RULES.get(domain)
+    if rules is not None:
+        recipe = {}
+        for field, (name, path) in rules.items():
+            for blob in blobs.get(name, []):
+                value = read_path(blob, path)
+                if value is not None:
+                    recipe[field] = value
+                    break
+        return recipe if len(recipe) > 0 else None
+
+    # JSON-LD is the most reliable source of a generic recipe.
+    ordered = blobs.pop('ld+json', [])
+    for others in blobs.values():
+        ordered.extend(others)
+
+    for blob in ordered:
+        found = find_recipe_object(blob)
+        if found is not None:
+            recipe = {}
+            for field, keys in RECIPE_FIELDS.items():
+                key = next((key for key in keys if found.get(key) is not None), None)
+                if key is not None:
+                    recipe[field] = found[key]
+            return recipe if len(recipe) > 0 else None
+    return None
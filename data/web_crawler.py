@@ -1,20 +1,49 @@
+import html
+import re
+import time
 import urllib.request
 from urllib.error import HTTPError, URLError
-from typing import Union
+from urllib.parse import urlsplit
+from typing import Union, Dict, List, Tuple, Iterable, Iterator
 
-from bs4 import BeautifulSoup
+from data.concurrency import AdaptiveLimiter
+from logger import LOGGER
 
-URL_EXTENSIONS = {"robots": "/robots.txt", "sitemap": "/sitemap.xml"}
+URL_EXTENSIONS = {"robots": "/robots.txt", "sitemap": "/sitemap.xml", "sitemap_index": "/sitemap_index.xml",
+                  "wp_sitemap": "/wp-sitemap.xml", "sitemap_gz": "/sitemap.xml.gz"}
 
+# The locations probed at once for every website by the sitemap discovery.
+DISCOVERY_EXTENSIONS = ('sitemap', 'robots', 'sitemap_index', 'wp_sitemap', 'sitemap_gz')
 
-def retrieveWebContent(url: str, extension: str = '', encoding: str = 'utf8',
-                       agent_headers: Union[None, dict] = None) -> Union[str, None]:
+# The <loc> elements of a flat sitemap and the markup the scanner can not handle.
+LOC_PATTERN = re.compile(rb'<loc>([^<]*)</loc>')
+LOC_UNSUPPORTED_PATTERN = re.compile(rb'<loc\s')
+SITEMAP_ROOT_PATTERN = re.compile(rb'<([\w.-]+:)?(?:urlset|sitemapindex)[\s/>]')
+COMMENT_PATTERN = re.compile(rb'<!--.*?-->', re.DOTALL)
+
+# The maximum amount of seconds to wait for the response of a host.
+REQUEST_TIMEOUT = 30
+
+# The limiter of the requests sent at once to every host.
+LIMITER = AdaptiveLimiter(timeout=REQUEST_TIMEOUT)
+
+# The functions called with (url, host, status, latency, error) after every request.
+FETCH_LISTENERS = []
+
+# Only one message out of this amount is logged for the messages logged for every url.
+LOG_SAMPLING = 100
+
+
+def retrieveWebContent(url: str, extension: str = '', encoding: Union[str, None] = 'utf8',
+                       agent_headers: Union[None, dict] = None, expected_miss: bool = False) \
+        -> Union[str, bytes, None]:
     """ Load the html content of a website.
 
     This function sends a request to a server using the given url with the given extension.
     The distant server can raise an error which will be handled in that function. This will
     cause the return type to be None. Otherwise, the return value will be the content of the
-    page.
+    page. The amount of requests sent at once to a host is limited by the #LIMITER,
+    which adapts to the latency and to the errors of the host.
 
     :param agent_headers: The user agent to use while requesting the content
                           cases were a permission error is raised. The agent used is Mozilla 5.0.
@@ -22,27 +51,70 @@ def retrieveWebContent(url: str, extension: str = '', encoding: str = 'utf8',
                           to retrieve multiple pages quickly into a website. The default
                           value of the extension is an empty string.
     :param url:           The url of the website's page.
-    :param encoding:      The encoding to use for the decoding part. Default is UTF-8.
+    :param encoding:      The encoding to use for the decoding part if the response does not
+                          give its charset. Default is UTF-8. The characters that can not be
+                          decoded are replaced. The raw bytes are returned without decoding
+                          if it is None.
+    :param expected_miss: Whether or not the page is only probed and may not exist. A missing
+                          page (404 or 410) is then logged as a sampled information.
     :return:              The content of the website as a string. If the content could not be
                           reached, it returns None.
     """
     combined_url = url + extension
+    host = urlsplit(combined_url).netloc
+    status = None
+    timed_out = False
+    error = None
+    LIMITER.acquire(host)
+    started = time.monotonic()
+    answered = None
     try:
 
         if agent_headers is None:
             agent_headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 6.1; Win64; x64)'}
 
         http_request = urllib.request.Request(combined_url, headers=agent_headers)
-        handle = urllib.request.urlopen(http_request)
+        handle = urllib.request.urlopen(http_request, timeout=REQUEST_TIMEOUT)
+        answered = time.monotonic()
         content = handle.read()
+        status = handle.status
+        charset = handle.headers.get_content_charset()
         handle.close()
-        return content.decode(encoding)
+        if encoding is None:
+            return content
+        try:
+            return content.decode(charset or encoding, 'replace')
+        except LookupError:
+            # The charset given by the response is unknown.
+            return content.decode(encoding, 'replace')
     except HTTPError as err:
-        print(f'Could not read the content of the following url: {combined_url}', err.code)
+        status = err.code
+        error = str(err)
+        if expected_miss and err.code in (404, 410):
+            LOGGER.log(3, 'Nothing found at the following url: %s %s', combined_url, err.code,
+                       prefix='[INFO] ', every=LOG_SAMPLING, url=combined_url, code=err.code)
+            return None
+        LOGGER.log(2, 'Could not read the content of the following url: %s %s', combined_url, err.code,
+                   prefix='[WARN] ', every=LOG_SAMPLING, url=combined_url, code=err.code)
         return None
     except URLError as err:
-        print(f'The following URL could not be found: {combined_url}', err.errno)
+        timed_out = isinstance(err.reason, TimeoutError)
+        error = str(err.reason)
+        LOGGER.log(2, 'The following URL could not be found: %s %s', combined_url, err.errno,
+                   prefix='[WARN] ', every=LOG_SAMPLING, url=combined_url, code=err.errno)
+        return None
+    except TimeoutError:
+        timed_out = True
+        error = 'timeout'
+        LOGGER.log(2, 'The following URL timed out: %s', combined_url, prefix='[WARN] ', every=LOG_SAMPLING,
+                   url=combined_url)
         return None
+    finally:
+        latency = time.monotonic() - started
+        # The limiter compares the latencies of the host, which must not depend on the size of the pages.
+        LIMITER.release(host, latency if answered is None else answered - started, status, timed_out)
+        for listener in FETCH_LISTENERS:
+            listener(combined_url, host, status, latency, error)
 
 
 def retrieveUrlBase(url: str) -> Union[None, str]:
@@ -64,11 +136,230 @@ def retrieveUrlBase(url: str) -> Union[None, str]:
                 urlBaseLastIndex = i
                 break
     if urlBaseLastIndex == 0:
-        print(f'Could not find the following URL: {url}')
+        LOGGER.log(2, 'Could not find the following URL: %s', url, prefix='[WARN] ', url=url)
         return None
     return url[:urlBaseLastIndex]
 
 
+def parse_robots(content: str) -> Tuple[Dict[str, Dict[str, List[str]]], List[str]]:
+    """ Parse every directive of a robots.txt file.
+
+    The directives are case insensitive and the comments are ignored. The
+    consecutive 'User-agent' lines form a group that receives the following
+    directives (Allow, Disallow, Crawl-delay...) until the next group. The
+    'Sitemap' directives do not belong to any group.
+
+    :param content: The content of the robots.txt file.
+    :return:        A tuple with the directives of every user agent in the first
+                    index and the urls of the sitemaps in the second index. The
+                    directives are indexed by their lowercase name.
+    """
+    groups = {}
+    sitemaps = []
+    agents = []
+    in_agents = False
+
+    # A byte order mark would otherwise be part of the first directive.
+    if content.startswith('\ufeff'):
+        content = content[1:]
+
+    for line in content.splitlines():
+        comment = line.find('#')
+        if comment != -1:
+            line = line[:comment]
+
+        separator = line.find(':')
+        if separator == -1:
+            continue
+        directive = line[:separator].strip().lower()
+        value = line[separator + 1:].strip()
+
+        if directive == 'sitemap':
+            if len(value) > 0:
+                sitemaps.append(value)
+        elif directive == 'user-agent':
+            # A user agent after other directives starts a new group.
+            if not in_agents:
+                agents = []
+                in_agents = True
+            agent = value.lower()
+            agents.append(agent)
+            groups.setdefault(agent, {})
+        else:
+            in_agents = False
+            for agent in agents:
+                groups[agent].setdefault(directive, []).append(value)
+
+    return groups, sitemaps
+
+
+def scan_sitemap_locs(content: bytes) -> Union[List[str], None]:
+    """ Extract the urls of a flat sitemap without parsing its XML tree.
+
+    The content is scanned for the <loc> elements directly in bytes. The
+    scanner only handles well-formed sitemaps whose <loc> elements have no
+    namespace prefix, no attributes and no CDATA sections. A content without
+    a <urlset> or a <sitemapindex> element (e.g. the HTML page of a website
+    answering every url) is not a sitemap and has no urls.
+
+    :param content: The raw content of the sitemap.
+    :return:        The urls of the sitemap or None if the sitemap must be
+                    parsed with a full XML parser.
+    """
+    if b'<!--' in content:
+        content = COMMENT_PATTERN.sub(b'', content)
+
+    root = SITEMAP_ROOT_PATTERN.search(content)
+    if root is None:
+        return []
+    if root.group(1) is not None or b'<![CDATA[' in content or LOC_UNSUPPORTED_PATTERN.search(content) is not None:
+        return None
+
+    locs = LOC_PATTERN.findall(content)
+    if len(locs) == 0:
+        return []
+
+    # The urls are decoded and unescaped all at once, joined by a character that
+    # they can not contain, even once unescaped since it is not allowed in XML.
+    joined = b'\x00'.join(locs).decode('utf8', 'replace')
+    if '&' in joined:
+        joined = joined.replace('&amp;', '&') if '&' not in joined.replace('&amp;', '') \
+            else html.unescape(joined)
+    return [url.strip() for url in joined.split('\x00')]
+
+
+def parse_sitemap(content: bytes) -> List[str]:
+    """ Get the urls of the <loc> elements of a sitemap.
+
+    The sitemap is scanned with #scan_sitemap_locs and the full XML
+    parser is only used if the sitemap could not be scanned.
+
+    :param content: The raw content of the sitemap.
+    :return:        The urls of the sitemap.
+    """
+    urls = scan_sitemap_locs(content)
+    if urls is None:
+        # BeautifulSoup and its XML backend are slow to import, only load them when needed.
+        from bs4 import BeautifulSoup
+
+        soup = BeautifulSoup(content, 'xml')
+        urls = [tag.get_text().strip() for tag in soup.find_all('loc')]
+    return urls
+
+
+def probe_sitemaps(urlBase: str, location: str) -> Union[Tuple[List[str], List[str]], None]:
+    """ Search for the sitemaps of a website at one of the #URL_EXTENSIONS.
+
+    The urls of a sitemap index are sitemaps themselves while the urls of
+    a sitemap of pages are pages of the probed sitemap.
+
+    :param urlBase:  The base url of the website.
+    :param location: The name of the extension to probe.
+    :return:         A tuple with the urls of the found sitemaps in the first
+                     index and the urls of the found pages in the second index,
+                     or None if there is nothing at this location.
+    """
+    if location == 'robots':
+        content = retrieveWebContent(urlBase, URL_EXTENSIONS.get(location), expected_miss=True)
+        sitemaps = None if content is None else parse_robots(content)[1]
+        return (sitemaps, []) if sitemaps else None
+
+    content = retrieveWebContent(urlBase, URL_EXTENSIONS.get(location), None, expected_miss=True)
+    if content is None:
+        return None
+    if content[:2] == b'\x1f\x8b':
+        import gzip
+
+        content = gzip.decompress(content)
+    urls = parse_sitemap(content)
+    if len(urls) == 0:
+        return None
+    if b'<sitemapindex' in content:
+        return urls, []
+    return [urlBase + URL_EXTENSIONS.get(location)], urls
+
+
+def discover_sitemaps(urls: Iterable[str], workers: int = 64) \
+        -> Iterator[Tuple[str, Union[Tuple[List[str], List[str]], None]]]:
+    """ Search for the sitemaps of many websites at once.
+
+    Every location of #DISCOVERY_EXTENSIONS is probed at once for a website
+    and the first location where sitemaps are found gives the result of the
+    website. The other probes of the website are then cancelled if they have
+    not started yet. The websites are read lazily and at most #workers of them
+    are searched at once, so the seed list can be arbitrarily long.
+
+    The requests are still limited by the #LIMITER, whose global limit is
+    raised to the amount of workers so that the workers are not waiting for
+    it. The limit of every host grows from its initial value (two requests
+    at once) with the responses of the host, and a probe waiting for its
+    host holds a worker meanwhile, so fewer requests than #workers may be
+    in flight until the limits of the hosts have grown.
+
+    :param urls:    The urls of the websites to search the sitemaps of.
+    :param workers: The maximum amount of requests sent at once.
+    :return:        An iterator over every url with its sitemaps and pages as
+                    returned by #probe_sitemaps or None, in the order the
+                    searches are resolved. The invalid urls are given with None.
+    """
+    from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+    seeds = enumerate(urls)
+    probes = {}
+    remaining = {}
+    rejected = []
+    LIMITER.raise_global_limit(workers)
+    with ThreadPoolExecutor(workers, thread_name_prefix='discovery') as executor:
+
+        def start_next() -> bool:
+            # The websites are identified by their position so that duplicated urls are searched twice.
+            for seed in seeds:
+                urlBase = retrieveUrlBase(seed[1])
+                if urlBase is None:
+                    rejected.append(seed[1])
+                    continue
+                remaining[seed] = len(DISCOVERY_EXTENSIONS)
+                for location in DISCOVERY_EXTENSIONS:
+                    probes[executor.submit(probe_sitemaps, urlBase, location)] = seed
+                return True
+            return False
+
+        while len(remaining) < workers and start_next():
+            pass
+
+        while len(probes) > 0 or len(rejected) > 0:
+            while len(rejected) > 0:
+                yield rejected.pop(0), None
+            if len(probes) == 0:
+                break
+
+            done, _ = wait(probes, return_when=FIRST_COMPLETED)
+            for probe in done:
+                seed = probes.pop(probe)
+                if seed not in remaining:
+                    continue
+                remaining[seed] -= 1
+
+                found = None
+                if not probe.cancelled():
+                    error = probe.exception()
+                    if error is None:
+                        found = probe.result()
+                    else:
+                        LOGGER.log(2, 'Could not probe the sitemaps of the following url: %s %s: %s', seed[1],
+                                   type(error).__name__, error, prefix='[WARN] ', every=LOG_SAMPLING, url=seed[1])
+                if found is None and remaining[seed] > 0:
+                    continue
+
+                # The website is resolved, its other probes are not needed anymore.
+                del remaining[seed]
+                for other, other_seed in list(probes.items()):
+                    if other_seed == seed and other.cancel():
+                        del probes[other]
+                yield seed[1], found
+                start_next()
+
+
 def find_sitemaps_url(url: str) -> Union[list, None]:
     """Search for the url(s) of the sitemap(s) of a website.
 
@@ -92,37 +383,28 @@ def find_sitemaps_url(url: str) -> Union[list, None]:
     if urlBase is None:
         return None
 
-    sitemapContent = retrieveWebContent(urlBase, URL_EXTENSIONS.get('sitemap'))
+    sitemapContent = retrieveWebContent(urlBase, URL_EXTENSIONS.get('sitemap'), None)
 
     # The sitemap file was found and will search into it.
     if sitemapContent is not None:
-        soup = BeautifulSoup(sitemapContent, 'xml')
-        tag = 'loc'
-        urls = soup.find_all(tag)
-        for i in range(len(urls)):
-            urls[i] = str(urls[i])[len(tag) + 2: -len(tag) - 3]
+        urls = parse_sitemap(sitemapContent)
     # The robots file was found.
     else:
-        print('Searching into robots.txt file')
+        LOGGER.log(3, 'Searching into robots.txt file', prefix='[INFO] ', every=LOG_SAMPLING)
         # Search into the sitemap if present. if the content of the sitemap does not refer to other sitemaps, return
         # the first sitemap.
         robotContent = retrieveWebContent(urlBase, URL_EXTENSIONS.get('robots'))
 
         if robotContent is None:
-            print('robots.txt file could not be retrieved.')
-            return None
-
-        lines = robotContent.split('\n')
-        if len(lines) == 0:
+            LOGGER.log(2, 'robots.txt file could not be retrieved: %s', urlBase, prefix='[WARN] ', url=urlBase)
             return None
 
-        for i in range(len(lines)):
-            if lines[i].startswith('Sitemap'):
-                urls.append(lines[i].split(':', 1)[1].replace(' ', ''))
+        urls = parse_robots(robotContent)[1]
 
         # No sitemap has been found for this website.
         if len(urls) == 0:
-            print(f'No sitemap has been found for the following website: {url}')
+            LOGGER.log(3, 'No sitemap has been found for the following website: %s', url, prefix='[INFO] ',
+                       every=LOG_SAMPLING, url=url)
             return None
 
         # Test the sitemap links to see if they are sitemap links themselves.
@@ -0,0 +1,179 @@
+"""
+Buffered logging backend shared by the console, the snake and the crawler.
+
+The messages are formatted and written by a background thread so that the
+callers never wait on the output. A message is only formatted if its level
+is enabled, and the messages that are logged for every url can be sampled.
+
+    variables:
+        LOGGER: the default logger writing into the standard output.
+
+    methods / functions:
+
+        log(level: int, message: str | callable, *args, prefix: str = '', every: int = 1, **fields)
+            -> Queue a message if the level is enabled. The message is formatted
+               with the args ('%' style) or called if it is a callable.
+        flush() -> Wait until every queued message has been written.
+"""
+from typing import Union, Callable, List, TextIO
+import atexit
+import json
+import queue
+import sys
+import threading
+import time
+
+# The lowest level of the messages that are dropped when the queue is full. The
+# more important messages (errors and warnings) wait for a free place instead.
+DROPPABLE_LEVEL = 3
+
+
+class TextSink:
+    """Write the messages as text lines into a stream."""
+
+    def __init__(self, stream: TextIO = None):
+        """
+        :param stream: The stream to write into. The standard output is used by default.
+        """
+        self.stream = stream
+
+    def write(self, record: dict):
+        stream = self.stream if self.stream is not None else sys.stdout
+        stream.write(record['prefix'] + record['message'] + '\n')
+
+    def flush(self):
+        stream = self.stream if self.stream is not None else sys.stdout
+        stream.flush()
+
+
+class JsonSink:
+    """Write the messages as JSON objects into a file, one per line."""
+
+    def __init__(self, path: str, append: bool = True):
+        """
+        :param path:   The path of the file to write into.
+        :param append: Whether or not the file should be appended.
+                       If false, the file's content will be cleared.
+        """
+        self.file = open(path, 'a' if append else 'w')
+
+    def write(self, record: dict):
+        self.file.write(json.dumps(record, default=str) + '\n')
+
+    def flush(self):
+        self.file.flush()
+
+
+class Logger:
+    """A logger with a bounded queue emptied by a background writer thread.
+
+    The more a level is high, the less the message is important. A message
+    with a level superior to the level of the logger is ignored before
+    anything is formatted. When the queue is full, the informative messages
+    (#DROPPABLE_LEVEL and above) are dropped instead of blocking the caller and
+    the amount of drops is logged later, while the errors and the warnings wait.
+    """
+
+    def __init__(self, level: int = 4, sinks: Union[List, None] = None, max_queued: int = 10000):
+        """
+        :param level:      The highest level of the messages to log.
+        :param sinks:      The sinks to write the messages into. The
+                           standard output is used by default.
+        :param max_queued: The maximum amount of messages waiting to be written.
+        """
+        self.level = level
+        self.sinks = sinks if sinks is not None else [TextSink()]
+        self.dropped = 0
+        self._queue = queue.Queue(max_queued)
+        self._counters = {}
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def is_enabled(self, level: int) -> bool:
+        return level <= self.level
+
+    def log(self, level: int, message: Union[str, Callable[[], str]], *args, prefix: str = '',
+            every: int = 1, **fields):
+        """Queue a message to be written by the background thread.
+
+        :param level:   The level of the message importance.
+        :param message: The message or a function returning the message. A
+                        string message is formatted with the args ('%' style)
+                        by the background thread.
+        :param args:    The arguments used to format the message.
+        :param prefix:  The prefix of the message. This can be expressed as a 'tag'.
+        :param every:   Only log one message out of every given amount of messages.
+                        This is used for the messages that are logged for every url.
+                        The messages are counted by their unformatted value
+                        or by the code of their function.
+        :param fields:  Structured values added to the message by the JSON sinks.
+        """
+        if level > self.level:
+            return
+
+        if every > 1:
+            key = getattr(message, '__code__', message)
+            with self._lock:
+                count = self._counters.get(key, 0)
+                self._counters[key] = count + 1
+            if count % every != 0:
+                return
+
+        self._start()
+        entry = (time.time(), level, prefix, message, args, fields)
+        if level < DROPPABLE_LEVEL:
+            self._queue.put(entry)
+            return
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+    def flush(self):
+        """Wait until every queued message has been written."""
+        if self._thread is not None:
+            self._queue.join()
+
+    def _start(self):
+        """Start the background writer thread on first use."""
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._write_forever, name='logger', daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+
+    def _write_forever(self):
+        while True:
+            entry = self._queue.get()
+            try:
+                self._write(*entry)
+                if self._queue.empty():
+                    self._report_dropped()
+                    for sink in self.sinks:
+                        sink.flush()
+            except Exception as err:
+                sys.stderr.write(f'Could not write a log message: {err}\n')
+            finally:
+                self._queue.task_done()
+
+    def _write(self, created: float, level: int, prefix: str, message, args: tuple, fields: dict):
+        if callable(message):
+            message = message()
+        elif args:
+            message = message % args
+        record = {'time': created, 'level': level, 'prefix': prefix, 'message': str(message)}
+        record.update(fields)
+        for sink in self.sinks:
+            sink.write(record)
+
+    def _report_dropped(self):
+        with self._lock:
+            dropped, self.dropped = self.dropped, 0
+        if dropped > 0:
+            self._write(time.time(), 2, '[WARN] ', f'{dropped} log messages were dropped.', (), {})
+
+
+LOGGER = Logger()
@@ -1,7 +1,17 @@
 from enum import Enum
 from typing import Tuple, Optional, Union, Dict, List
+import inspect
 import os
 import platform
+import re
+import threading
+import time
+
+from logger import LOGGER
+
+# An argument is a sequence of characters that are not whitespaces, where the
+# whitespaces inside double quotes are kept. An unclosed quote goes until the end.
+_ARGUMENT_PATTERN = re.compile(r'(?:[^\s"]|"[^"]*"?)+')
 
 
 class LogLevel(Enum):
@@ -18,6 +28,83 @@ class LogLevel(Enum):
     INPUT = 0, '[INPUT] '
 
 
+class Job:
+    """A job is an action that the snake performs in the background.
+
+    An action receives its job through its 'job' parameter if it has one.
+    It can then report its progress with #advance and should stop as soon
+    as the job has been cancelled.
+    """
+
+    def __init__(self, job_id: int, name: str, snake: 'Snake', report_interval: float = 5.0):
+        """
+        :param job_id:          The identifier of the job.
+        :param name:            The name of the action performed by the job.
+        :param snake:           The snake that tells the progress of the job.
+        :param report_interval: The minimum amount of seconds between two progress reports.
+        """
+        self.id = job_id
+        self.name = name
+        self.future = None
+        self.done = 0
+        self.total = None
+        self.started = time.monotonic()
+        self.finished = None
+        self._snake = snake
+        self._report_interval = report_interval
+        self._last_report = self.started
+        self._cancelled = threading.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        """Whether or not the job has been asked to stop."""
+        return self._cancelled.is_set()
+
+    def advance(self, amount: int = 1, total: Union[int, None] = None):
+        """Report the progress of the job.
+
+        :param amount: The amount of items (e.g. urls) that have been processed.
+        :param total:  The total amount of items to process if it is known.
+        """
+        self.done += amount
+        if total is not None:
+            self.total = total
+
+        now = time.monotonic()
+        if now - self._last_report >= self._report_interval:
+            self._last_report = now
+            self._snake.tell(self.status(), LogLevel.INFO)
+
+    def cancel(self) -> bool:
+        """Ask the job to stop.
+
+        :return: A boolean value of true if the job was still running.
+        """
+        if self.future is None or self.future.done():
+            return False
+        self._cancelled.set()
+        self.future.cancel()
+        return True
+
+    def state(self) -> str:
+        """Get the state of the job: running, cancelled, failed or finished."""
+        if self.future is None or not self.future.done():
+            return 'cancelling' if self.cancelled else 'running'
+        if self.future.cancelled() or self.cancelled:
+            return 'cancelled'
+        return 'failed' if self.future.exception() is not None else 'finished'
+
+    def status(self) -> str:
+        """Get a readable status of the job with its rate and its remaining time."""
+        elapsed = max((self.finished or time.monotonic()) - self.started, 1e-9)
+        rate = self.done / elapsed
+        progress = str(self.done) if self.total is None else f'{self.done}/{self.total}'
+        status = f'#{self.id} {self.name} [{self.state()}] {progress} ({rate:.1f}/s'
+        if self.total is not None and rate > 0 and self.state() == 'running':
+            status += f', ETA {max(self.total - self.done, 0) / rate:.0f}s'
+        return status + ')'
+
+
 class Snake:
     """This is the snake class.
 
@@ -28,9 +115,15 @@ class Snake:
     def __init__(self):
         self._clear_cmd = 'cls' if 'Windows' in platform.platform() else 'clear'
 
-        # The list of the actions. Each actions has attributes:
-        # (name, function, description, usage, specification)
-        self._actions = []
+        # The actions indexed by their name. Each actions has attributes:
+        # (name, function, description, usage, specification, signature, background)
+        self._actions = {}
+
+        # The jobs performed in the background indexed by their identifier.
+        # Coroutine actions run on the event loop, the other ones in the executor.
+        self._jobs = {}
+        self._executor = None
+        self._loop = None
 
         # The level of logging accepted by the snake.
         # Everything lower than that would be ignore.
@@ -59,9 +152,12 @@ class Snake:
         self.mind = information
 
     def learn(self, action_name: str, action: callable, description: str,
-              usage: str, specification: str = ''):
+              usage: str, specification: str = '', background: bool = False):
         """Make the snake learn a new action.
 
+        :param background:    Whether or not the action is long-running and should be
+                              performed as a background job. Coroutine actions are
+                              always performed as background jobs.
         :param specification: The specification for the usage of the action or
                               what it does.
         :param usage:         How to use the action.
@@ -82,7 +178,15 @@ class Snake:
                 or not isinstance(specification, str):
             return
 
-        self._actions.append((action_name, action, description, usage, specification))
+        # The signature is used to validate the arguments before performing the action.
+        try:
+            signature = inspect.signature(action)
+        except (TypeError, ValueError):
+            signature = None
+
+        background = background or inspect.iscoroutinefunction(action)
+        self._actions[action_name] = (action_name, action, description, usage, specification, signature,
+                                      background)
 
     def perform(self, action_command: str):
         """Make the snake perform an action.
@@ -90,7 +194,7 @@ class Snake:
         :param action_command: The command to perform.
         """
 
-        command = self.old_split_action_command(action_command)
+        command = self._process_command_input(action_command)
 
         if command is None:
             self.tell('Could not perform the action due to an error in the command syntax.',
@@ -103,19 +207,79 @@ class Snake:
         if action is None:
             return
 
-        try:
-            if len(command[1]) == 0:
-                action[1]()
-            else:
-                if isinstance(command[1], tuple):
+        values = command[1] or ()
+        kwargs = command[2] or {}
+
+        # The job is given to the action by the snake, never by the command.
+        takes_job = action[5] is not None and 'job' in action[5].parameters
+        if takes_job:
+            kwargs.pop('job', None)
+            kwargs['job'] = None
+
+        if action[5] is not None:
+            try:
+                action[5].bind(*values, **kwargs)
+            except TypeError:
+                self.tell("Could not perform the action '" + command[0] + "'. Usage: " + action[3],
+                          LogLevel.ERROR, error=None)
+                return
+
+        if not action[6]:
+            # An error raised by the action must not stop the snake.
+            try:
+                action[1](*values, **kwargs)
+            except Exception as err:
+                self.tell(f"Could not perform the action '{command[0]}': {err}", LogLevel.ERROR, error=None)
+            return
 
-                    print(command[1])
-                    action[1](*command[1])
-                else:
-                    action[1](**command[1])
-        except TypeError:
-            self.tell("Could not perform the action '" + command[0] + "'",
-                      LogLevel.ERROR, error=None)
+        job = Job(len(self._jobs) + 1, action[0], self)
+        if takes_job:
+            kwargs['job'] = job
+        self._jobs[job.id] = job
+
+        # The job modules are slow to import, only load them when a job is performed.
+        if inspect.iscoroutinefunction(action[1]):
+            import asyncio
+
+            job.future = asyncio.run_coroutine_threadsafe(action[1](*values, **kwargs), self._event_loop())
+        else:
+            if self._executor is None:
+                from concurrent.futures import ThreadPoolExecutor
+
+                self._executor = ThreadPoolExecutor(thread_name_prefix='snake-job')
+            job.future = self._executor.submit(action[1], *values, **kwargs)
+        job.future.add_done_callback(lambda future: self._job_done(job))
+        self.tell(f"Started the job #{job.id} for the action '{action[0]}'.", LogLevel.INFO)
+
+    def jobs(self):
+        """Tell the status of every job performed by the snake."""
+        if len(self._jobs) == 0:
+            self.tell('The snake has no job.')
+            return
+        for job in self._jobs.values():
+            self.tell(job.status())
+
+    def status(self, job_id: str):
+        """Tell the status of a job.
+
+        :param job_id: The identifier of the job.
+        """
+        job = self._get_job(job_id)
+        if job is not None:
+            self.tell(job.status())
+
+    def cancel(self, job_id: str):
+        """Cancel a job that is running.
+
+        :param job_id: The identifier of the job.
+        """
+        job = self._get_job(job_id)
+        if job is None:
+            return
+        if job.cancel():
+            self.tell(f'The job #{job.id} has been asked to stop.', LogLevel.INFO)
+        else:
+            self.tell(f'The job #{job.id} is not running.', LogLevel.WARNING)
 
     def help(self, action: Optional[Union[None, str]] = None):
         """Send a help message about all the possible actions or a specific action.
@@ -124,7 +288,11 @@ class Snake:
                             to get help on every possible actions.
         """
         if action is not None:
-            action = self._get_action(action)
+            name = action
+            action = self._get_action(name)
+            if action is None:
+                self.tell(f"The snake has not learnt the action '{name}'.", LogLevel.WARNING)
+                return
             tag_len = 16
             self.tell(f"About the '{action[0]}' action:")
             self.tell('Description: '.ljust(tag_len) + action[2])
@@ -136,7 +304,7 @@ class Snake:
                 self.tell('The snake has learnt no action yet !')
             else:
                 self.tell("About the available actions:\n")
-                for action in self._actions:
+                for action in self._actions.values():
                     self.tell(action[0] + ': ' + action[2])
                 self.tell("\nType 'help <action>' to get help on a specific action.")
                 self.tell('You can always perform a command using a command as follow: \n'
@@ -177,7 +345,7 @@ class Snake:
 
             tag.format(error)
 
-        print(tag + output)
+        LOGGER.log(level.value[0], output, prefix=tag)
 
     def ask(self, question: str = '') -> str:
         """Make the snake ask a question to the user.
@@ -186,55 +354,9 @@ class Snake:
         :return          A string representing the input given to the snake.
         """
         self.tell(question, LogLevel.INPUT)
+        LOGGER.flush()
         return input('> ')
 
-    def old_split_action_command(self, command: str) \
-            -> Union[Tuple[str, Union[Dict[str, str], Tuple[str]]], None]:
-
-        if len(command.replace(' ', '')) == 0:
-            return None
-
-        parts = command.split(' ', 1)
-        action_name = parts[0]
-
-        if len(parts) == 1:
-            return action_name, tuple()
-
-        valid_args = {}
-
-        args = parts[1].split(' ')
-
-        # Positional arguments.
-        if '=' not in args[0]:
-            for i in range(len(args)):
-                args[i] = args[i].strip()
-            return action_name, tuple(args)
-        # Key-value arguments.
-        else:
-            def wrong(arg):
-                self.tell(f"Could not load the argument '{arg}'. Make sure it "
-                          f"uses this pattern: 'key=value'", LogLevel.WARNING)
-
-            for i in range(len(args)):
-                if '=' not in args[i]:
-                    wrong(args[i])
-                    continue
-
-                kv_pair = args[i].split('=', 1)
-                if len(kv_pair[0]) > 0 and len(kv_pair[1]) > 0:
-
-                    # Single quote declaration.
-                    if kv_pair[1].startswith("'") \
-                            and kv_pair[1].endswith("'") \
-                            and len(kv_pair[1]) > 1:
-                        pass
-
-                    valid_args.update({kv_pair[0]: kv_pair[1]})
-                else:
-                    wrong(args[i])
-
-        return action_name, valid_args
-
     def _has_learnt(self, action_name: str) -> bool:
         """Check if the snake has learnt an action.
 
@@ -243,24 +365,63 @@ class Snake:
         :return:            A Boolean value of true if the
                             snake has learnt the given action name.
         """
-        return self._get_action(action_name) is not None
+        return action_name in self._actions
 
-    def _get_action(self, action_name: str) -> Union[Tuple[str, callable, str, str], None]:
+    def _get_action(self, action_name: str) -> Union[Tuple[str, callable, str, str, str, object, bool], None]:
         """Get an action from its name.
 
         :param action_name: The name of the actions to get.
         :return: The action or None if the action was not found.
         """
-        for action in self._actions:
-            if action[0] == action_name:
-                return action
-        return None
+        return self._actions.get(action_name)
+
+    def _get_job(self, job_id: str) -> Union[Job, None]:
+        """Get a job from its identifier.
+
+        :param job_id: The identifier of the job as a string.
+        :return: The job or None if the job was not found.
+        """
+        job = self._jobs.get(int(job_id)) if job_id.isdigit() else None
+        if job is None:
+            self.tell(f"There is no job with the identifier '{job_id}'.", LogLevel.WARNING)
+        return job
+
+    def _job_done(self, job: Job):
+        """Tell the final status of a job once it is done.
+
+        :param job: The job that is done.
+        """
+        from concurrent.futures import CancelledError
+
+        job.finished = time.monotonic()
+        try:
+            error = job.future.exception()
+        except CancelledError:
+            error = None
+        if error is not None:
+            self.tell(f'{job.status()}: {error}', LogLevel.ERROR)
+        else:
+            self.tell(job.status(), LogLevel.INFO)
+
+    def _event_loop(self) -> 'asyncio.AbstractEventLoop':
+        """Get the event loop of the coroutine actions.
+
+        The loop is created and started in a daemon thread on first use.
+        :return: The running event loop.
+        """
+        if self._loop is None:
+            import asyncio
+
+            self._loop = asyncio.new_event_loop()
+            threading.Thread(target=self._loop.run_forever, name='snake-loop', daemon=True).start()
+        return self._loop
 
     def clean(self):
         """Clean all the outputs of the snake and inputs.
 
         Clears the console's so that there are no more text on screen.
         """
+        LOGGER.flush()
         os.system(self._clear_cmd)
 
     def _process_command_input(self, command: str) \
@@ -298,79 +459,39 @@ class Snake:
         """
 
         # Check if the command is valid.
-        if command is None or not isinstance(command, str) or len(command.replace(' ', '')) == 0:
+        if command is None or not isinstance(command, str) or len(command.strip()) == 0:
             return None
 
-        # Split the command with whitespaces and return it if it does not have arguments.
-        split = command.split(' ')
+        # Split the command name and return it if it does not have arguments. The name ends
+        # at the first whitespace, like the arguments (see #_ARGUMENT_PATTERN).
+        split = command.strip().split(maxsplit=1)
         command_name = split[0]
         if len(split) == 1:
             return command_name, None, None
 
-        args = []
-
-        # Getting the arguments separately.
-        in_quotes = False
-        i = len(command_name)
-        while i < len(command):
-            char = command[i]
-            if char == ' ' and not in_quotes:
-                i += 1
-                continue
-
-            j = 0
-            arg = []
-            while i + j < len(command) and (command[i + j] != ' ' or in_quotes):
-                if command[i + j] == '"':
-                    if not in_quotes:
-                        in_quotes = True
-                    else:
-                        in_quotes = False
-                arg.append(command[i + j])
-                j += 1
-            else:
-                i += j
-            i += 1
-            args.append(''.join(arg))
-
         values = []
         kwargs = {}
 
-        # TODO rewrite under here.
-
-        # Parsing the arguments.
-        for arg in args:
-            if arg[len(arg) - 1] == '"':
-                # Search for the other quotes.
-                second_quotes = arg.find('"')
-                if second_quotes != -1 and second_quotes != len(arg) - 1:
-                    if len(arg[:second_quotes]) == 0:
-                        # value pattern
-                        if len(arg) == 2:  # "" case.
-                            values.append('')
-                        else:
-                            values.append(arg[1:-1])
-                    elif '=' in arg[:second_quotes]:
-                        pass
-                        # key-value pattern
-                        kv = arg.split('=', 1)
-                        value = ''
-                        if len(kv[1]) > 2:
-                            value = kv[1][1:-1]
-                        kwargs.update({kv[0]: value})
-                    else:
-                        # error can't handle that format.
-                        self.tell('Could not handle this argument: ' + arg, LogLevel.WARNING)
-            else:
-                equal_char = arg.find('=')
-                if equal_char != -1 and equal_char > 0:
-                    key_name = arg[:equal_char]
-                    if equal_char + 1 == len(arg):
-                        kwargs.update({key_name: ''})
-                    else:
-                        kwargs.update({key_name: arg[equal_char + 1:]})
+        # Parsing the arguments in a single pass over the command.
+        for arg in _ARGUMENT_PATTERN.findall(split[1]):
+            quote = arg.find('"')
+            equal_char = arg.find('=')
+
+            # value pattern: "value"
+            if quote == 0:
+                if len(arg) > 1 and arg.endswith('"') and arg.count('"') == 2:
+                    values.append(arg[1:-1])
                 else:
-                    values.append(arg)
+                    # error can't handle that format.
+                    self.tell('Could not handle this argument: ' + arg, LogLevel.WARNING)
+            # key-value pattern: key=value or key="value"
+            elif equal_char > 0 and (quote == -1 or equal_char < quote):
+                value = arg[equal_char + 1:]
+                if len(value) > 1 and value.startswith('"') and value.endswith('"'):
+                    value = value[1:-1]
+                kwargs[arg[:equal_char]] = value
+            else:
+                values.append(arg)
         return command_name, values, kwargs
 
 
@@ -379,5 +500,9 @@ if __name__ == '__main__':
     s.learn('help', s.help, 'Get the help of the snake on something.', 'help (action)',
             'This action can be used to get a general help on every possible actions the snake '
             'can perform or on a specific action by providing its name as the action argument.')
+    s.learn('jobs', s.jobs, 'See the status of every background job.', 'jobs')
+    s.learn('status', s.status, 'See the status of a background job.', 'status <job_id>')
+    s.learn('cancel', s.cancel, 'Cancel a background job.', 'cancel <job_id>',
+            'The job stops as soon as the action notices it has been cancelled.')
     s.perform('help ')
 